@@ -1,5 +1,6 @@
 from pymongo import MongoClient
 import datetime
+import random
 
 # --- CONFIGURATION ---
 # URI pour une connexion locale. Pas besoin de secrets ici.
@@ -41,6 +42,8 @@ SAMPLE_QCM = [
         "option_D": "L'infiltration",
         "correct_option": "C",
         "source_text": "La première étape majeure est l'évaporation. Le soleil chauffe l'eau des océans, des lacs et des rivières, la transformant en vapeur d'eau qui monte dans l'atmosphère.",
+        "niveau": "CM1",
+        "difficulty": "moyenne",
         "created_at": datetime.datetime.utcnow()
     },
     {
@@ -51,6 +54,8 @@ SAMPLE_QCM = [
         "option_D": "Dans la sève",
         "correct_option": "B",
         "source_text": "Le processus se déroule dans des organites cellulaires appelés chloroplastes, qui contiennent un pigment vert, la chlorophylle.",
+        "niveau": "6ème",
+        "difficulty": "moyenne",
         "created_at": datetime.datetime.utcnow()
     },
     {
@@ -61,6 +66,8 @@ SAMPLE_QCM = [
         "option_D": "L'oxygène",
         "correct_option": "D",
         "source_text": "L'un des sous-produits les plus importants de la photosynthèse est l'oxygène (O2). Ce gaz, indispensable à la respiration de la plupart des êtres vivants, y compris les humains, est libéré dans l'atmosphère.",
+        "niveau": "6ème",
+        "difficulty": "moyenne",
         "created_at": datetime.datetime.utcnow()
     }
 ]
@@ -75,6 +82,8 @@ SAMPLE_FITB = [
         "option_D": "évaporation",
         "correct_option": "B",
         "source_text": "Ensuite vient la condensation. En altitude, la vapeur d'eau se refroidit et se transforme en de minuscules gouttelettes d'eau ou des cristaux de glace, formant ainsi les nuages.",
+        "niveau": "CM1",
+        "difficulty": "moyenne",
         "created_at": datetime.datetime.utcnow()
     },
     {
@@ -85,6 +94,8 @@ SAMPLE_FITB = [
         "option_D": "chimique",
         "correct_option": "D",
         "source_text": "La photosynthèse est le processus biochimique fondamental qui permet aux plantes vertes, aux algues et à certaines bactéries de convertir l'énergie lumineuse du soleil en énergie chimique.",
+        "niveau": "6ème",
+        "difficulty": "moyenne",
         "created_at": datetime.datetime.utcnow()
     },
     {
@@ -95,6 +106,8 @@ SAMPLE_FITB = [
         "option_D": "xanthophylle",
         "correct_option": "A",
         "source_text": "...les chloroplastes, qui contiennent un pigment vert, la chlorophylle.",
+        "niveau": "6ème",
+        "difficulty": "moyenne",
         "created_at": datetime.datetime.utcnow()
     }
 ]
@@ -102,6 +115,12 @@ SAMPLE_FITB = [
 
 # --- SCRIPT D'INSERTION ---
 
+def with_random_keys(questions):
+    # Clé aléatoire indexée utilisée par quiz_server.py pour l'échantillonnage (l'empreinte est calculée à l'import / au démarrage).
+    for q in questions:
+        q["rand"] = random.random()
+    return questions
+
 def populate_database():
     try:
         print("Connexion à la base de données locale MongoDB...")
@@ -123,13 +142,13 @@ def populate_database():
         # Insertion des QCM
         if SAMPLE_QCM:
             print(f"Insertion de {len(SAMPLE_QCM)} questions QCM...")
-            db.qcm_questions.insert_many(SAMPLE_QCM)
+            db.qcm_questions.insert_many(with_random_keys(SAMPLE_QCM))
             print("QCM insérés avec succès.")
             
         # Insertion des FITB
         if SAMPLE_FITB:
             print(f"Insertion de {len(SAMPLE_FITB)} questions FITB...")
-            db.fitb_questions.insert_many(SAMPLE_FITB)
+            db.fitb_questions.insert_many(with_random_keys(SAMPLE_FITB))
             print("FITB insérés avec succès.")
             
         print("\n=== Base de données initialisée avec succès ! ===")
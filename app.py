@@ -3,7 +3,11 @@ import os
 from huggingface_hub import hf_hub_download
 from flask import Flask, jsonify, request
 from llama_cpp import Llama
+from llama_tuning import load_tuned_config, calibrate
+import argparse
 import re
+import threading
+from contextlib import contextmanager
 import traceback # Import for better error logging
 
 app = Flask(__name__)
@@ -11,44 +15,53 @@ app = Flask(__name__)
 MODEL_LOADED = False
 LLM_INSTANCE = None
 GGUF_PATH = None
+# llama.cpp instances are not thread-safe: serialize generations (the UI now prefetches upcoming chunks concurrently)
+LLM_CONDITION = threading.Condition()
+LLM_STATE = {"busy": False, "interactive_waiting": 0}
 
 # --- Configuration for the new QCM+FITB model ---
 NEW_MODEL_REPO_ID = "goalaphx/outputs_qcm_then_fitb"
 NEW_MODEL_FILENAME = "qwen2_5_1.5B_instruct_finetuned_fr_qcm_fitb.q8_0.gguf"
 # --- End Configuration ---
 
+def ensure_model_downloaded():
+    print("Checking if QCM+FITB model is already downloaded...")
+    target_dir = os.path.expanduser(f"./models_{NEW_MODEL_REPO_ID.replace('/', '_')}")
+    os.makedirs(target_dir, exist_ok=True)
+    model_path = os.path.join(target_dir, NEW_MODEL_FILENAME)
+
+    if os.path.exists(model_path):
+        print(f"QCM+FITB Model already exists at: {model_path}")
+        return model_path
+    print(f"QCM+FITB Model not found at {model_path}, downloading from {NEW_MODEL_REPO_ID}...")
+    model_path = hf_hub_download(
+        repo_id=NEW_MODEL_REPO_ID,
+        filename=NEW_MODEL_FILENAME,
+        local_dir=target_dir,
+        local_dir_use_symlinks=False
+    )
+    print(f"QCM+FITB Model downloaded to: {model_path}")
+    return model_path
+
 def load_model():
     global MODEL_LOADED, LLM_INSTANCE, GGUF_PATH
     if MODEL_LOADED:
         print("Model already loaded.")
         return
 
-    print("Checking if QCM+FITB model is already downloaded...")
     try:
-        target_dir = os.path.expanduser(f"./models_{NEW_MODEL_REPO_ID.replace('/', '_')}")
-        os.makedirs(target_dir, exist_ok=True)
-        model_path = os.path.join(target_dir, NEW_MODEL_FILENAME)
-
-        if os.path.exists(model_path):
-            GGUF_PATH = model_path
-            print(f"QCM+FITB Model already exists at: {GGUF_PATH}")
-        else:
-            print(f"QCM+FITB Model not found at {model_path}, downloading from {NEW_MODEL_REPO_ID}...")
-            GGUF_PATH = hf_hub_download(
-                repo_id=NEW_MODEL_REPO_ID,
-                filename=NEW_MODEL_FILENAME,
-                local_dir=target_dir,
-                local_dir_use_symlinks=False
-            )
-            print(f"QCM+FITB Model downloaded to: {GGUF_PATH}")
+        GGUF_PATH = ensure_model_downloaded()
 
         if GGUF_PATH and os.path.exists(GGUF_PATH):
             print(f"Loading Llama instance from: {GGUF_PATH}")
+            tuned = load_tuned_config(GGUF_PATH) # falls back to n_ctx=2048, n_threads=cpu_count//2 if never calibrated
             LLM_INSTANCE = Llama(
                 model_path=GGUF_PATH,
-                n_ctx=2048,
+                n_ctx=tuned["n_ctx"],
                 n_gpu_layers=-1,
-                n_threads=max(1, os.cpu_count() // 2),
+                n_threads=tuned["n_threads"],
+                n_threads_batch=tuned["n_threads_batch"],
+                n_batch=tuned["n_batch"],
                 chat_format="chatml",
                 verbose=True
             )
@@ -63,6 +76,24 @@ def load_model():
         traceback.print_exc()
         MODEL_LOADED = False
 
+@contextmanager
+def llm_slot(low_priority=False):
+    """
+    Exclusive access to LLM_INSTANCE.
+    Low-priority requests (background pre-generation) only start when no interactive request is waiting.
+    """
+    with LLM_CONDITION:
+        if not low_priority: LLM_STATE["interactive_waiting"] += 1
+        LLM_CONDITION.wait_for(lambda: not LLM_STATE["busy"] and (not low_priority or LLM_STATE["interactive_waiting"] == 0))
+        if not low_priority: LLM_STATE["interactive_waiting"] -= 1
+        LLM_STATE["busy"] = True
+    try:
+        yield
+    finally:
+        with LLM_CONDITION:
+            LLM_STATE["busy"] = False
+            LLM_CONDITION.notify_all()
+
 @app.route('/')
 def home():
     status = "Model Loaded" if MODEL_LOADED else "Model NOT Loaded (or loading failed)"
@@ -152,21 +183,22 @@ Génère un QCM à partir de ce texte.<|im_end|>
     full_response = ""
 
     try:
-        output_stream = LLM_INSTANCE(
-            prompt_qcm,
-            max_tokens=350, # Increased slightly for potentially longer options/questions
-            temperature=0.5,
-            top_p=0.9,
-            stop=["<|im_end|>", "assistant"], # Added "assistant" as a potential stop
-            stream=True
-        )
-
-        print("Streaming QCM response: ", end="")
-        for chunk in output_stream:
-            token_text = chunk["choices"][0]["text"]
-            full_response += token_text
-            print(token_text, end="", flush=True)
-        print("\n--- End of QCM Stream ---")
+        with llm_slot(low_priority=data.get("priority") == "low"):
+            output_stream = LLM_INSTANCE(
+                prompt_qcm,
+                max_tokens=350, # Increased slightly for potentially longer options/questions
+                temperature=0.5,
+                top_p=0.9,
+                stop=["<|im_end|>", "assistant"], # Added "assistant" as a potential stop
+                stream=True
+            )
+
+            print("Streaming QCM response: ", end="")
+            for chunk in output_stream:
+                token_text = chunk["choices"][0]["text"]
+                full_response += token_text
+                print(token_text, end="", flush=True)
+            print("\n--- End of QCM Stream ---")
 
         full_response = full_response.strip()
         print(f"Raw QCM full_response from model:\n{full_response}")
@@ -220,21 +252,22 @@ Génère une question 'compléter la phrase' avec des options (A, B, C, D) et la
     full_response = ""
 
     try:
-        output_stream = LLM_INSTANCE(
-            prompt_fitb,
-            max_tokens=350, # Increased slightly
-            temperature=0.5,
-            top_p=0.9,
-            stop=["<|im_end|>", "assistant"], # Added "assistant" as a potential stop
-            stream=True
-        )
-
-        print("Streaming FITB response: ", end="")
-        for chunk in output_stream:
-            token_text = chunk["choices"][0]["text"]
-            full_response += token_text
-            print(token_text, end="", flush=True)
-        print("\n--- End of FITB Stream ---")
+        with llm_slot(low_priority=data.get("priority") == "low"):
+            output_stream = LLM_INSTANCE(
+                prompt_fitb,
+                max_tokens=350, # Increased slightly
+                temperature=0.5,
+                top_p=0.9,
+                stop=["<|im_end|>", "assistant"], # Added "assistant" as a potential stop
+                stream=True
+            )
+
+            print("Streaming FITB response: ", end="")
+            for chunk in output_stream:
+                token_text = chunk["choices"][0]["text"]
+                full_response += token_text
+                print(token_text, end="", flush=True)
+            print("\n--- End of FITB Stream ---")
 
         full_response = full_response.strip()
         print(f"Raw FITB full_response from model:\n{full_response}")
@@ -252,6 +285,12 @@ Génère une question 'compléter la phrase' avec des options (A, B, C, D) et la
     return response
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="QCM and FITB Generation API")
+    parser.add_argument("--calibrate", action="store_true", help="Benchmark llama.cpp settings on this machine and save the best ones before starting")
+    args = parser.parse_args()
+    if args.calibrate:
+        calibrate(ensure_model_downloaded())
+
     print("Application starting...")
     if not MODEL_LOADED:
         load_model()
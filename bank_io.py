@@ -0,0 +1,227 @@
+"""Export/import en flux de la banque de questions (QCM + FITB) au format JSONL ou Parquet.
+
+Exemples :
+-- python bank_io.py export banque.jsonl --collection all --since 2024-01-01 --niveau CM1
+-- python bank_io.py export banque.parquet --format parquet --shard-size 100000
+-- python bank_io.py import banque-*.parquet
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import sys
+
+from db_utils import QUESTION_COLLECTIONS, backfill_fingerprints, ensure_question_indexes, get_db, iter_questions, question_fingerprint, upsert_questions
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_FIELDS = ["question_type", "question", "option_A", "option_B", "option_C", "option_D", "correct_option",
+                 "source_text", "niveau", "difficulty", "verified", "verification", "fingerprint", "created_at"]
+DEFAULT_BATCH_SIZE = 1000
+
+
+def parse_date(value):
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def build_query(args):
+    query = {}
+    since, until = parse_date(args.since), parse_date(args.until)
+    if since or until:
+        query["created_at"] = {}
+        if since: query["created_at"]["$gte"] = since
+        if until: query["created_at"]["$lt"] = until
+    if args.niveau: query["niveau"] = args.niveau
+    if args.difficulty: query["difficulty"] = args.difficulty
+    if args.verified == "yes": query["verified"] = True
+    elif args.verified == "no": query["verified"] = {"$ne": True}
+    return query
+
+
+def to_row(doc, question_type):
+    row = {f: doc.get(f) for f in EXPORT_FIELDS}
+    row["question_type"] = question_type
+    row["fingerprint"] = doc.get("fingerprint") or question_fingerprint(doc)
+    return row
+
+
+def from_row(row):
+    doc = {k: v for k, v in row.items() if v is not None}
+    if isinstance(doc.get("created_at"), str):
+        doc["created_at"] = datetime.datetime.fromisoformat(doc["created_at"])
+    return doc
+
+
+# --- WRITERS ---
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write_batch(self, rows):
+        for row in rows:
+            row = dict(row, created_at=row["created_at"].isoformat() if row.get("created_at") else None)
+            self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        if pa is None: raise RuntimeError("pyarrow est requis pour le format Parquet (pip install pyarrow).")
+        fields = [pa.field(f, pa.string()) for f in EXPORT_FIELDS if f not in ("verified", "created_at")]
+        self.schema = pa.schema(fields + [pa.field("verified", pa.bool_()), pa.field("created_at", pa.timestamp("us"))])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write_batch(self, rows):
+        self.writer.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class ShardedWriter:
+    """Répartit les lignes sur plusieurs fichiers de `shard_size` lignes au plus (0 = un seul fichier)."""
+
+    def __init__(self, path, writer_cls, shard_size=0):
+        self.stem, self.ext = os.path.splitext(path)
+        self.path, self.writer_cls, self.shard_size = path, writer_cls, shard_size
+        self.writer, self.shard_index, self.rows_in_shard, self.paths = None, 0, 0, []
+
+    def _open_next(self):
+        if self.writer: self.writer.close()
+        path = f"{self.stem}-{self.shard_index:05d}{self.ext}" if self.shard_size else self.path
+        self.writer, self.rows_in_shard = self.writer_cls(path), 0
+        self.shard_index += 1
+        self.paths.append(path)
+
+    def write_batch(self, rows):
+        while rows:
+            if self.writer is None or (self.shard_size and self.rows_in_shard >= self.shard_size):
+                self._open_next()
+            room = self.shard_size - self.rows_in_shard if self.shard_size else len(rows)
+            self.writer.write_batch(rows[:room])
+            self.rows_in_shard += len(rows[:room])
+            rows = rows[room:]
+
+    def close(self):
+        if self.writer is None: self._open_next()  # export vide : on produit quand même un fichier
+        self.writer.close()
+
+
+# --- READERS ---
+
+def read_jsonl(path, batch_size):
+    batch = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip(): continue
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch: yield batch
+
+
+def read_parquet(path, batch_size):
+    if pq is None: raise RuntimeError("pyarrow est requis pour le format Parquet (pip install pyarrow).")
+    for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield record_batch.to_pylist()
+
+
+# --- COMMANDES ---
+
+def selected_types(collection):
+    return list(QUESTION_COLLECTIONS) if collection == "all" else [collection.upper()]
+
+
+def export_bank(args):
+    writer_cls = ParquetWriter if args.format == "parquet" else JsonlWriter
+    out = ShardedWriter(args.path, writer_cls, args.shard_size)
+    query, total = build_query(args), 0
+    try:
+        for question_type in selected_types(args.collection):
+            batch = []
+            for doc in iter_questions(QUESTION_COLLECTIONS[question_type], query, args.batch_size):
+                batch.append(to_row(doc, question_type))
+                if len(batch) >= args.batch_size:
+                    out.write_batch(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                out.write_batch(batch)
+                total += len(batch)
+    finally:
+        out.close()
+    print(f"{total} questions exportées vers {len(out.paths)} fichier(s) : {', '.join(out.paths)}")
+
+
+def import_bank(args):
+    paths = sorted(p for pattern in args.paths for p in glob.glob(pattern))
+    if not paths: sys.exit("Aucun fichier à importer.")
+    default_type = None if args.collection == "all" else args.collection.upper()
+    # Les questions antérieures à l'empreinte doivent l'avoir, sinon l'upsert les dupliquerait.
+    for collection_name in QUESTION_COLLECTIONS.values():
+        backfilled = backfill_fingerprints(collection_name, args.batch_size)
+        if backfilled: print(f"{backfilled} empreinte(s) calculée(s) pour {collection_name}.")
+        ensure_question_indexes(collection_name)
+    upserted, modified, skipped = 0, 0, 0
+    for path in paths:
+        reader = read_parquet if path.endswith(".parquet") else read_jsonl
+        row_number = 0
+        for rows in reader(path, args.batch_size):
+            by_type = {}
+            for row in rows:
+                row_number += 1
+                question_type = str(row.get("question_type") or default_type or "QCM").upper()
+                if question_type not in QUESTION_COLLECTIONS:
+                    print(f"{path}, ligne {row_number} ignorée : question_type '{row.get('question_type')}' invalide (QCM ou FITB).")
+                    skipped += 1
+                    continue
+                by_type.setdefault(question_type, []).append(from_row(row))
+            for question_type, docs in by_type.items():
+                for doc in docs: doc.pop("question_type", None)
+                u, m = upsert_questions(QUESTION_COLLECTIONS[question_type], docs, args.batch_size)
+                upserted += u; modified += m
+        print(f"Importé : {path}")
+    print(f"Import terminé : {upserted} nouvelles questions, {modified} mises à jour, {skipped} ligne(s) ignorée(s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export/import de la banque de questions.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="Exporter les questions")
+    exp.add_argument("path", help="Fichier de sortie (.jsonl ou .parquet)")
+    exp.add_argument("--format", choices=["jsonl", "parquet"], default=None)
+    exp.add_argument("--since", help="Date ISO minimale de création (incluse)")
+    exp.add_argument("--until", help="Date ISO maximale de création (exclue)")
+    exp.add_argument("--niveau")
+    exp.add_argument("--difficulty")
+    exp.add_argument("--verified", choices=["yes", "no"])
+    exp.add_argument("--shard-size", type=int, default=0, help="Nombre maximal de questions par fichier")
+
+    imp = sub.add_parser("import", help="Importer (upsert par empreinte) des questions")
+    imp.add_argument("paths", nargs="+", help="Fichiers ou motifs glob (.jsonl / .parquet)")
+
+    for p in (exp, imp):
+        p.add_argument("--collection", choices=["qcm", "fitb", "all"], default="all")
+        p.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    args = parser.parse_args()
+    if get_db() is None: sys.exit("Connexion à MongoDB impossible (vérifiez .streamlit/secrets.toml).")
+    if args.command == "export":
+        args.format = args.format or ("parquet" if args.path.endswith(".parquet") else "jsonl")
+        export_bank(args)
+    else:
+        import_bank(args)
+
+
+if __name__ == "__main__":
+    main()
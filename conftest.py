@@ -0,0 +1 @@
+# Rend les modules de la racine (quality_filter, text_utils...) importables par les tests lancés avec `pytest`.
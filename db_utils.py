@@ -1,9 +1,17 @@
 import streamlit as st
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from bson.objectid import ObjectId
 import datetime
+import hashlib
+import random
+from vector_index import get_vector_index
+from text_utils import chunk_text_by_paragraph
 
 DB_NAME = "projet_lsi"
+QUESTION_COLLECTIONS = {"QCM": "qcm_questions", "FITB": "fitb_questions"}
+DRAFTS_COLLECTION = "question_drafts"
+FINGERPRINT_FIELDS = ["question", "option_A", "option_B", "option_C", "option_D", "correct_option", "source_text"]
 
 @st.cache_resource
 def get_mongo_client():
@@ -21,6 +29,11 @@ def get_db():
     if client is None: return None
     return client[DB_NAME]
 
+def _sync_vector_index(method, *args):
+    # L'index vectoriel est un cache reconstructible (python vector_index.py rebuild) : un échec ne bloque pas l'écriture en BDD.
+    try: getattr(get_vector_index(), method)(*args)
+    except Exception as e: print(f"Index vectoriel non mis à jour ({method}) : {e}")
+
 def load_texts():
     db = get_db()
     if db is None: return []
@@ -29,37 +42,223 @@ def load_texts():
 def add_text(text_content, level, difficulty):
     db = get_db()
     if db is None: return None
-    doc = {"texte": text_content, "niveau": level, "difficulty": difficulty, "created_at": datetime.datetime.utcnow()}
-    return db.textes.insert_one(doc).inserted_id
+    now = datetime.datetime.utcnow()
+    doc = {"texte": text_content, "niveau": level, "difficulty": difficulty, "created_at": now, "updated_at": now}
+    text_id = db.textes.insert_one(doc).inserted_id
+    _sync_vector_index("index_text", str(text_id), text_content)
+    return text_id
 
 def update_text(text_id, new_content, new_level, new_difficulty):
     db = get_db()
     if db is None: return None
-    db.textes.update_one({"_id": ObjectId(text_id)}, {"$set": {"texte": new_content, "niveau": new_level, "difficulty": new_difficulty}})
+    db.textes.update_one({"_id": ObjectId(text_id)}, {"$set": {"texte": new_content, "niveau": new_level, "difficulty": new_difficulty, "updated_at": datetime.datetime.utcnow()}})
+    _sync_vector_index("index_text", str(text_id), new_content)
 
 def delete_text(text_id):
     db = get_db()
     if db is None: return None
     db.textes.delete_one({"_id": ObjectId(text_id)})
+    db[DRAFTS_COLLECTION].delete_many({"text_id": str(text_id)})
+    _sync_vector_index("remove_text", str(text_id))
 
 def load_questions(collection_name):
     db = get_db()
     if db is None: return []
     return list(db[collection_name].find())
 
-def save_question(question_data, context, question_type):
+def question_fingerprint(doc):
+    # Empreinte stable du contenu (casse et espaces normalisés) : sert de clé d'upsert pour l'import/export.
+    parts = [" ".join(str(doc.get(f) or "").lower().split()) for f in FINGERPRINT_FIELDS]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def save_question(question_data, context, question_type, level=None, difficulty=None, verified=False, verification=None):
     db = get_db()
     if db is None: raise ConnectionError("Connexion à la BDD échouée.")
-    collection_name = "qcm_questions" if question_type == "QCM" else "fitb_questions"
-    doc = {"question": question_data.get("question"), "option_A": question_data.get("A"), "option_B": question_data.get("B"), "option_C": question_data.get("C"), "option_D": question_data.get("D"), "correct_option": question_data.get("reponse"), "source_text": context, "created_at": datetime.datetime.utcnow()}
-    db[collection_name].insert_one(doc)
+    collection_name = QUESTION_COLLECTIONS.get(question_type, "qcm_questions")
+    doc = {"question": question_data.get("question"), "option_A": question_data.get("A"), "option_B": question_data.get("B"), "option_C": question_data.get("C"), "option_D": question_data.get("D"), "correct_option": question_data.get("reponse"), "source_text": context, "niveau": level, "difficulty": difficulty, "verified": verified, "verification": verification, "created_at": datetime.datetime.utcnow()}
+    doc["fingerprint"] = question_fingerprint(doc)
+    doc["rand"] = random.random()
+    try:
+        q_id = db[collection_name].insert_one(doc).inserted_id
+    except DuplicateKeyError:  # même contenu déjà en base : on renvoie la question existante
+        return db[collection_name].find_one({"fingerprint": doc["fingerprint"]}, {"_id": 1})["_id"]
+    _sync_vector_index("index_question", collection_name, str(q_id), doc)
+    return q_id
+
+def ensure_question_indexes(collection_name):
+    db = get_db()
+    if db is None: return None
+    # L'empreinte est la clé d'upsert de l'import : unique (lancer backfill_fingerprints avant pour les anciennes questions).
+    try:
+        db[collection_name].create_index("fingerprint", unique=True, partialFilterExpression={"fingerprint": {"$type": "string"}})
+    except OperationFailure as e:
+        print(f"Index unique sur 'fingerprint' impossible pour {collection_name} (questions en double ?) : {e}")
+        db[collection_name].create_index("fingerprint")
+    db[collection_name].create_index("created_at")
+    # Index haché : les segments sont longs, seule l'égalité exacte est utile (couverture d'un texte).
+    db[collection_name].create_index([("source_text", "hashed")])
+    # Clé aléatoire indexée : échantillonnage d'un quiz sans parcours complet de la collection.
+    db[collection_name].create_index([("niveau", 1), ("difficulty", 1), ("rand", 1)])
+    db[collection_name].create_index("rand")
+
+def backfill_random_keys(collection_name, batch_size=1000):
+    db = get_db()
+    if db is None: return 0
+    ops, updated = [], 0
+    for doc in db[collection_name].find({"rand": {"$exists": False}}, {"_id": 1}).batch_size(batch_size):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"rand": random.random()}}))
+        if len(ops) >= batch_size:
+            updated += db[collection_name].bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops: updated += db[collection_name].bulk_write(ops, ordered=False).modified_count
+    return updated
+
+def backfill_question_levels(collection_name, batch_size=1000):
+    # Questions enregistrées avant le report niveau/difficulté : on retrouve leur texte via l'empreinte de `source_text`.
+    # Seules les questions sans niveau sont lues (index niveau/difficulty/rand) : quasi gratuit une fois la migration faite.
+    db = get_db()
+    if db is None: return 0
+    levels = {}
+    for text in db.textes.find({}, {"texte": 1, "niveau": 1, "difficulty": 1}):
+        for chunk in chunk_text_by_paragraph(text.get("texte", "")):
+            levels[chunk_hash(chunk)] = {"niveau": text.get("niveau"), "difficulty": text.get("difficulty")}
+    ops, updated = [], 0
+    for doc in db[collection_name].find({"niveau": None}, {"source_text": 1}).batch_size(batch_size):
+        level = levels.get(chunk_hash(doc.get("source_text") or ""))
+        if level is None: continue
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": level}))
+        if len(ops) >= batch_size:
+            updated += db[collection_name].bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops: updated += db[collection_name].bulk_write(ops, ordered=False).modified_count
+    return updated
+
+def count_questions_by_chunk(text_content):
+    # {segment: nombre de questions QCM + FITB générées à partir de ce segment} (correspondance exacte sur `source_text`).
+    db = get_db()
+    chunks = chunk_text_by_paragraph(text_content)
+    if db is None or not chunks: return {}
+    counts = dict.fromkeys(chunks, 0)
+    pipeline = [{"$match": {"source_text": {"$in": chunks}}}, {"$group": {"_id": "$source_text", "n": {"$sum": 1}}}]
+    for collection_name in QUESTION_COLLECTIONS.values():
+        for row in db[collection_name].aggregate(pipeline): counts[row["_id"]] += row["n"]
+    return counts
+
+def get_questions_by_ids(collection_name, q_ids):
+    db = get_db()
+    if db is None: return []
+    return list(db[collection_name].find({"_id": {"$in": [ObjectId(q) for q in q_ids]}}))
+
+def sample_questions(collection_name, n, level=None, difficulty=None):
+    # Tire un point au hasard sur la clé `rand` puis lit les n suivants (avec retour au début si besoin).
+    db = get_db()
+    if db is None: return []
+    query = {k: v for k, v in (("niveau", level), ("difficulty", difficulty)) if v}
+    pivot = random.random()
+    docs = list(db[collection_name].find({**query, "rand": {"$gte": pivot}}).sort("rand", 1).limit(n))
+    if len(docs) < n:
+        docs += list(db[collection_name].find({**query, "rand": {"$lt": pivot}}).sort("rand", 1).limit(n - len(docs)))
+    return docs
+
+def backfill_fingerprints(collection_name, batch_size=1000):
+    db = get_db()
+    if db is None: return 0
+    ops, updated = [], 0
+    for doc in db[collection_name].find({"fingerprint": {"$exists": False}}).batch_size(batch_size):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"fingerprint": question_fingerprint(doc)}}))
+        if len(ops) >= batch_size:
+            updated += db[collection_name].bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops: updated += db[collection_name].bulk_write(ops, ordered=False).modified_count
+    return updated
+
+def iter_questions(collection_name, query=None, batch_size=1000, projection=None):
+    # Curseur par lots trié par _id : la mémoire reste bornée quelle que soit la taille de la collection.
+    db = get_db()
+    if db is None: return
+    cursor = db[collection_name].find(query or {}, projection).sort("_id", 1).batch_size(batch_size)
+    try:
+        for doc in cursor: yield doc
+    finally:
+        cursor.close()
+
+def upsert_questions(collection_name, docs, batch_size=1000):
+    db = get_db()
+    if db is None: raise ConnectionError("Connexion à la BDD échouée.")
+    ops, batch_docs, upserted, modified = [], [], 0, 0
+    def flush():
+        result = db[collection_name].bulk_write(ops, ordered=False)
+        # Seules les nouvelles questions sont indexées : une question mise à jour a la même empreinte, donc le même
+        # texte indexé (question, options, source). Réimporter la même banque n'ajoute aucune ligne à l'index.
+        _sync_vector_index("index_questions", collection_name, [dict(batch_docs[i], _id=q_id) for i, q_id in result.upserted_ids.items()])
+        return result.upserted_count, result.modified_count
+    for doc in docs:
+        doc = {k: v for k, v in doc.items() if k != "_id"}
+        doc.setdefault("fingerprint", question_fingerprint(doc))
+        update = {"$set": doc}
+        if "rand" not in doc: update["$setOnInsert"] = {"rand": random.random()}
+        ops.append(UpdateOne({"fingerprint": doc["fingerprint"]}, update, upsert=True))
+        batch_docs.append(doc)
+        if len(ops) >= batch_size:
+            u, m = flush(); upserted += u; modified += m
+            ops, batch_docs = [], []
+    if ops:
+        u, m = flush(); upserted += u; modified += m
+    return upserted, modified
 
 def update_question(collection_name, q_id, new_data):
+    # Renvoie False si le contenu modifié est identique à une autre question (même empreinte).
     db = get_db()
     if db is None: return None
-    db[collection_name].update_one({"_id": ObjectId(q_id)}, {"$set": new_data})
+    doc = db[collection_name].find_one({"_id": ObjectId(q_id)})
+    if doc is None: return None
+    doc.update(new_data)
+    new_data = dict(new_data, fingerprint=question_fingerprint(doc))
+    try:
+        db[collection_name].update_one({"_id": ObjectId(q_id)}, {"$set": new_data})
+    except DuplicateKeyError:
+        return False
+    _sync_vector_index("index_question", collection_name, str(q_id), doc)
+    return True
     
 def delete_question(collection_name, q_id):
     db = get_db()
     if db is None: return None
-    db[collection_name].delete_one({"_id": ObjectId(q_id)})
\ No newline at end of file
+    db[collection_name].delete_one({"_id": ObjectId(q_id)})
+    _sync_vector_index("remove_question", collection_name, str(q_id))
+
+# --- BROUILLONS PRÉ-GÉNÉRÉS (pregen_worker.py) ---
+
+def chunk_hash(chunk):
+    return hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+
+def ensure_draft_indexes():
+    db = get_db()
+    if db is None: return None
+    db[DRAFTS_COLLECTION].create_index([("text_id", 1), ("chunk_hash", 1), ("question_type", 1)], unique=True)
+
+def load_drafts(text_id, status="pending"):
+    # {(chunk_hash, question_type): brouillon} pour un texte (status=None : tous les statuts).
+    db = get_db()
+    if db is None or not text_id: return {}
+    query = {"text_id": str(text_id)}
+    if status: query["status"] = status
+    return {(d["chunk_hash"], d["question_type"]): d for d in db[DRAFTS_COLLECTION].find(query)}
+
+def save_draft(text_id, chunk_index, chunk, question_type, data, prefilter=None, status="pending"):
+    db = get_db()
+    if db is None: raise ConnectionError("Connexion à la BDD échouée.")
+    key = {"text_id": str(text_id), "chunk_hash": chunk_hash(chunk), "question_type": question_type}
+    doc = {"chunk_index": chunk_index, "status": status, "data": data, "prefilter": prefilter, "created_at": datetime.datetime.utcnow()}
+    db[DRAFTS_COLLECTION].update_one(key, {"$set": doc}, upsert=True)
+
+def invalidate_stale_drafts(text_id, chunk_hashes):
+    # Un segment modifié change d'empreinte : seuls ses brouillons sont supprimés, les autres restent valides.
+    db = get_db()
+    if db is None: return 0
+    return db[DRAFTS_COLLECTION].delete_many({"text_id": str(text_id), "chunk_hash": {"$nin": list(chunk_hashes)}}).deleted_count
+
+def set_draft_status(text_id, chunk, question_type, status):
+    db = get_db()
+    if db is None: return None
+    db[DRAFTS_COLLECTION].update_one({"text_id": str(text_id), "chunk_hash": chunk_hash(chunk), "question_type": question_type}, {"$set": {"status": status}})
@@ -0,0 +1,26 @@
+import requests
+import json
+
+FLASK_API_BASE_URL = "http://localhost:5000"
+QCM_ENDPOINT = f"{FLASK_API_BASE_URL}/generate_qcm"
+FITB_ENDPOINT = f"{FLASK_API_BASE_URL}/generate_fitb"
+
+def endpoint_for(question_type):
+    return QCM_ENDPOINT if question_type == "QCM" else FITB_ENDPOINT
+
+def call_flask_api(endpoint_url, text_input, priority=None):
+    payload = {"texte": text_input}
+    if priority: payload["priority"] = priority
+    headers = {"Content-Type": "application/json"}
+    try:
+        response = requests.post(endpoint_url, data=json.dumps(payload), headers=headers, timeout=180)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        error_details = {"error": f"Erreur de requête API: {e}", "raw_output": "Erreur de connexion API"}
+        if hasattr(e, 'response') and e.response is not None:
+            try: error_details.update(e.response.json())
+            except json.JSONDecodeError: error_details["raw_output"] = e.response.text
+        return error_details
+    except json.JSONDecodeError:
+        return {"error": "Erreur Décodage JSON", "raw_output": "JSON invalide reçu de l'API"}
@@ -1,18 +1,18 @@
 import streamlit as st
-import requests
-import json
+from concurrent.futures import ThreadPoolExecutor
 import re
 from groq import Groq
-from db_utils import load_texts, save_question, get_mongo_client
+from db_utils import load_texts, save_question, get_mongo_client, load_drafts, set_draft_status, chunk_hash
+from text_utils import chunk_text_by_paragraph
+from generation_client import call_flask_api, endpoint_for
+from quality_filter import prefilter_question, estimate_tokens, MAX_AUTO_REGENERATIONS, VERIFICATION_RESPONSE_TOKENS
 
 # --- CONFIG & INITIALIZATION ---
 st.set_page_config(page_title="Générateur de Questions", layout="wide")
 get_mongo_client()
 
 # --- CONSTANTS ---
-FLASK_API_BASE_URL = "http://localhost:5000"
-QCM_ENDPOINT = f"{FLASK_API_BASE_URL}/generate_qcm"
-FITB_ENDPOINT = f"{FLASK_API_BASE_URL}/generate_fitb"
+PREFETCH_DEPTH = 2  # nombre de segments générés à l'avance pendant la relecture du segment courant
 
 # --- GROQ CLIENT INITIALIZATION ---
 groq_client = None
@@ -30,25 +30,7 @@ except Exception as e:
     st.sidebar.error(f"Erreur initialisation Groq: {e}")
 
 # --- HELPER FUNCTIONS ---
-def call_flask_api(endpoint_url, text_input):
-    payload = {"texte": text_input}
-    headers = {"Content-Type": "application/json"}
-    try:
-        response = requests.post(endpoint_url, data=json.dumps(payload), headers=headers, timeout=180)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        error_details = {"error": f"Erreur de requête API: {e}", "raw_output": "Erreur de connexion API"}
-        if hasattr(e, 'response') and e.response is not None:
-            try: error_details.update(e.response.json())
-            except json.JSONDecodeError: error_details["raw_output"] = e.response.text
-        return error_details
-    except json.JSONDecodeError:
-        return {"error": "Erreur Décodage JSON", "raw_output": "JSON invalide reçu de l'API"}
-
-def call_groq_for_verification(context_text, q_data, question_type):
-    if not groq_client: return "Vérification IA non disponible (client Groq non initialisé)."
-    
+def build_verification_prompt(context_text, q_data, question_type):
     prompt_parts_base = [f"Vous êtes un assistant IA expert, extrêmement rigoureux, spécialisé dans l'évaluation et l'amélioration de questions pédagogiques ({question_type}). **Votre réponse doit être en français, structurée et directement exploitable.**", "\n**Contexte de la Question :**\n---\n" + context_text + "\n---", f"\n**Question Générée à Évaluer :**", f"  - **Type :** {question_type}", f"  - **Question :** {q_data.get('question', 'N/A')}", f"  - **Options :** A) {q_data.get('A', 'N/A')}, B) {q_data.get('B', 'N/A')}, C) {q_data.get('C', 'N/A')}, D) {q_data.get('D', 'N/A')}", f"  - **Réponse Attendue :** {q_data.get('reponse', 'N/A')}", "\n" + "="*40, "**VOTRE MISSION : ANALYSE ET CORRECTION**", "="*40,]
     instructions, response_format = [], ["   - **Avis Général:** [Un seul mot: Excellente, Bonne, Médiocre, ou Invalide].", "   - **Analyse Point par Point:**"]
     if question_type == "FITB":
@@ -60,15 +42,96 @@ def call_groq_for_verification(context_text, q_data, question_type):
     response_header_number = 3 if question_type == "FITB" else 2
     instructions.append(f"\n**{response_header_number}. Format de Réponse Exigé (Structure Impérative) :**")
     response_format.extend(["     - **Exactitude :** [Votre évaluation]", "     - **Clarté :** [Votre évaluation]", "     - **Qualité Options :** [Votre évaluation]", "\n   - **Suggestions d'Amélioration :**", "     *Si la question originale est 'Excellente', écrivez simplement 'Aucune amélioration nécessaire.'.*", "     *SINON, fournissez OBLIGATOIREMENT une version corrigée complète (Question, Options, Réponse, Justification).*"])
-    full_prompt = "\n".join(prompt_parts_base + instructions + response_format)
+    return "\n".join(prompt_parts_base + instructions + response_format)
+
+def call_groq_for_verification(context_text, q_data, question_type):
+    if not groq_client: return "Vérification IA non disponible (client Groq non initialisé)."
+    full_prompt = build_verification_prompt(context_text, q_data, question_type)
     try:
         chat_completion = groq_client.chat.completions.create(messages=[{"role": "user", "content": full_prompt}], model="llama3-70b-8192", temperature=0.0)
         return chat_completion.choices[0].message.content
     except Exception as e: return f"Erreur lors de l'appel à l'API Groq : {e}"
 
-def chunk_text_by_paragraph(text):
-    if not text: return []
-    return [p.strip() for p in re.split(r'\n\s*\n', text.strip()) if p.strip()]
+def get_prefetch_executor():
+    # Un seul worker par session : les segments suivants sont générés l'un après l'autre, donc au plus
+    # une génération périmée reste en cours quand l'utilisateur change de texte ou de type.
+    if 'prefetch_executor' not in st.session_state:
+        st.session_state.prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+    return st.session_state.prefetch_executor
+
+def cancel_prefetch():
+    # Les générations en file sont annulées ; celle déjà lancée ne peut pas l'être : son résultat est abandonné.
+    for future in st.session_state.get('prefetch', {}).values(): future.cancel()
+    st.session_state.prefetch = {}
+
+def pending_draft(idx):
+    # Brouillon pré-généré par pregen_worker.py pour ce segment et ce type, s'il existe.
+    draft = st.session_state.drafts.get((chunk_hash(st.session_state.chunks[idx]), st.session_state.question_type))
+    return draft["data"] if draft else None
+
+def mark_draft(idx, status):
+    # Le brouillon quitte la file "pending" : il ne sera plus proposé ni régénéré par le worker.
+    if not st.session_state.text_meta.get('_id'): return
+    st.session_state.drafts.pop((chunk_hash(st.session_state.chunks[idx]), st.session_state.question_type), None)
+    set_draft_status(st.session_state.text_meta['_id'], st.session_state.chunks[idx], st.session_state.question_type, status)
+
+def schedule_prefetch():
+    q_type, chunks = st.session_state.question_type, st.session_state.chunks
+    endpoint = endpoint_for(q_type)
+    start = st.session_state.current_chunk_index + 1
+    for idx in range(start, min(start + PREFETCH_DEPTH, len(chunks))):
+        if (idx, q_type) not in st.session_state.prefetch and pending_draft(idx) is None:
+            # Priorité basse : un clic de l'utilisateur passe devant dans llm_slot (app.py).
+            st.session_state.prefetch[(idx, q_type)] = get_prefetch_executor().submit(call_flask_api, endpoint, chunks[idx], priority="low")
+
+def take_generated(idx):
+    draft = pending_draft(idx)
+    if draft is not None: return draft
+    future = st.session_state.prefetch.pop((idx, st.session_state.question_type), None)
+    # Déjà lancée : on attend son résultat ; encore en file : annulée et remplacée par un appel prioritaire.
+    if future is not None and not future.cancel(): return future.result()
+    endpoint = endpoint_for(st.session_state.question_type)
+    return call_flask_api(endpoint, st.session_state.chunks[idx])
+
+def generate_with_prefilter(idx):
+    # Régénère tant que le pré-filtre local rejette la question (dans la limite de MAX_AUTO_REGENERATIONS).
+    draft = pending_draft(idx)
+    data = take_generated(idx)
+    q_type, chunk = st.session_state.question_type, st.session_state.chunks[idx]
+    if not st.session_state.use_prefilter: return data
+    endpoint = endpoint_for(q_type)
+    for _ in range(MAX_AUTO_REGENERATIONS):
+        if "error" in data or prefilter_question(chunk, data, q_type)[0] != "reject": break
+        st.session_state.prefilter_stats["regenerated"] += 1
+        data = call_flask_api(endpoint, chunk)
+    if draft is not None and data is not draft: mark_draft(idx, "rejected")
+    return data
+
+def verify_question(context_text, q_data, question_type):
+    stats = st.session_state.prefilter_stats
+    verdict, score, reasons = prefilter_question(context_text, q_data, question_type)
+    if st.session_state.use_prefilter and verdict != "borderline":
+        stats["avoided_calls"] += 1
+        stats["avoided_tokens"] += estimate_tokens(build_verification_prompt(context_text, q_data, question_type)) + VERIFICATION_RESPONSE_TOKENS
+        if verdict == "reject": stats["auto_rejected"] += 1
+        label = "Invalide" if verdict == "reject" else "Bonne"
+        details = "\n".join(f"- {r}" for r in reasons)
+        st.session_state.verification_status = {"source": "prefilter", "approved": verdict == "accept"}
+        return f"**Avis Général (pré-filtre local, score {score:.2f}) :** {label}\n\n{details}\n\n*Vérification Groq non nécessaire.*"
+    stats["remote_calls"] += 1
+    response = call_groq_for_verification(context_text, q_data, question_type)
+    st.session_state.verification_status = {"source": "groq", "approved": groq_approves(response)}
+    return response
+
+def groq_approves(response):
+    match = re.search(r"Avis G[ée]n[ée]ral[\s*:\[]*(Excellente|Bonne|Médiocre|Invalide)", response or "", re.IGNORECASE)
+    return bool(match) and match.group(1).lower() in ("excellente", "bonne")
+
+def verification_for_save(prefilter_verdict):
+    # Statut persisté avec la question (filtre --verified de bank_io.py) : analyse explicite si faite, sinon pré-filtre.
+    status = st.session_state.verification_status
+    if status: return status["approved"], status["source"]
+    return prefilter_verdict == "accept", "prefilter"
 
 def display_highlighted_context(full_text, current_chunk):
     highlighted_text = full_text.replace(current_chunk, f"<mark>{current_chunk}</mark>").replace('\n', '<br>')
@@ -81,8 +144,14 @@ if 'question_type' not in st.session_state: st.session_state.question_type = "QC
 if 'chunks' not in st.session_state: st.session_state.chunks = []
 if 'generated_data' not in st.session_state: st.session_state.generated_data = None
 if 'verification_response' not in st.session_state: st.session_state.verification_response = None
+if 'verification_status' not in st.session_state: st.session_state.verification_status = None
 if 'current_chunk_index' not in st.session_state: st.session_state.current_chunk_index = -1
 if 'question_saved_status' not in st.session_state: st.session_state.question_saved_status = {}
+if 'text_meta' not in st.session_state: st.session_state.text_meta = {}
+if 'prefetch' not in st.session_state: st.session_state.prefetch = {}
+if 'drafts' not in st.session_state: st.session_state.drafts = {}
+if 'use_prefilter' not in st.session_state: st.session_state.use_prefilter = True
+if 'prefilter_stats' not in st.session_state: st.session_state.prefilter_stats = {"remote_calls": 0, "avoided_calls": 0, "avoided_tokens": 0, "auto_rejected": 0, "regenerated": 0}
 
 # --- INTERFACE ---
 st.title("📝 Générateur de Questions Itératif")
@@ -91,14 +160,17 @@ col1, col2 = st.columns([1, 1], gap="large")
 with col1:
     st.subheader("1. Source du Texte")
     db_texts = load_texts()
-    text_options = {f"{t.get('niveau', 'N/A')} - {t['texte'][:40].replace(chr(10), ' ')}...": t['texte'] for t in db_texts}
+    text_options = {f"{t.get('niveau', 'N/A')} - {t['texte'][:40].replace(chr(10), ' ')}...": t for t in db_texts}
     options_list = ["-- Entrée Manuelle --"] + list(text_options.keys())
     
     selected_label = st.selectbox("Choisir un texte ou entrer manuellement", options_list, key="text_selector")
     if st.session_state.get('last_selected') != selected_label:
         st.session_state.last_selected = selected_label
-        st.session_state.full_text = text_options.get(selected_label, "")
-        for key in ['chunks', 'generated_data', 'current_context', 'verification_response', 'question_saved_status']: 
+        selected_text = text_options.get(selected_label, {})
+        st.session_state.full_text = selected_text.get('texte', "")
+        st.session_state.text_meta = {"_id": str(selected_text['_id']) if '_id' in selected_text else None, "niveau": selected_text.get('niveau'), "difficulty": selected_text.get('difficulty')}
+        cancel_prefetch()
+        for key in ['chunks', 'generated_data', 'current_context', 'verification_response', 'verification_status', 'question_saved_status']: 
             st.session_state[key] = {} if key == 'question_saved_status' else None
         st.session_state.current_chunk_index = -1
         st.rerun()
@@ -114,15 +186,19 @@ with col1:
     new_q_type = st.radio("Type de question :", question_type_options, index=q_type_index, horizontal=True)
     if new_q_type != old_q_type:
         st.session_state.question_type = new_q_type
+        cancel_prefetch()
         st.session_state.generated_data = None
         st.session_state.verification_response = None
+        st.session_state.verification_status = None
         st.rerun()
 
     if st.button("🚀 Préparer le Texte", use_container_width=True, disabled=not st.session_state.full_text.strip()):
+        cancel_prefetch()
         st.session_state.chunks = chunk_text_by_paragraph(st.session_state.full_text)
+        st.session_state.drafts = load_drafts(st.session_state.text_meta.get('_id'))
         st.session_state.current_chunk_index = -1
         st.session_state.generated_data = None
-        if st.session_state.chunks: st.success(f"{len(st.session_state.chunks)} segments trouvés.")
+        if st.session_state.chunks: st.success(f"{len(st.session_state.chunks)} segments trouvés, {len(st.session_state.drafts)} question(s) pré-générée(s).")
         else: st.warning("Aucun segment trouvé.")
         st.rerun()
 
@@ -138,12 +214,16 @@ with col2:
             idx = st.session_state.current_chunk_index
             st.session_state.current_context = st.session_state.chunks[idx]
             st.session_state.verification_response = None
-            endpoint = QCM_ENDPOINT if st.session_state.question_type == "QCM" else FITB_ENDPOINT
+            st.session_state.verification_status = None
             with st.spinner("Génération..."):
-                st.session_state.generated_data = call_flask_api(endpoint, st.session_state.current_context)
+                st.session_state.generated_data = generate_with_prefilter(idx)
             st.rerun()
 
+        schedule_prefetch()
         st.progress((st.session_state.current_chunk_index + 1) / total if total > 0 else 0)
+        next_future = st.session_state.prefetch.get((st.session_state.current_chunk_index + 1, st.session_state.question_type))
+        if next_future is not None:
+            st.caption("⚡ Question suivante prête." if next_future.done() else "⏳ Question suivante en préparation en arrière-plan...")
 
         if st.session_state.generated_data:
             st.divider()
@@ -160,6 +240,9 @@ with col2:
                 opt_cols[1].markdown(f"**C)** {data.get('C', 'N/A')}")
                 opt_cols[1].markdown(f"**D)** {data.get('D', 'N/A')}")
                 st.markdown(f"**Réponse correcte :** <span style='color:green; font-weight:bold;'>{data.get('reponse', 'N/A')}</span>", unsafe_allow_html=True)
+                verdict, score, reasons = prefilter_question(st.session_state.current_context, data, st.session_state.question_type)
+                verdict_label = {"accept": "✅ Acceptable", "borderline": "🟠 À vérifier", "reject": "❌ Rejetée"}[verdict]
+                st.caption(f"Pré-filtre local : {verdict_label} (score {score:.2f}) — " + " ".join(reasons))
                 
                 idx = st.session_state.current_chunk_index
                 
@@ -169,7 +252,9 @@ with col2:
                 
                 if not st.session_state.question_saved_status.get(save_status_key, False):
                     if st.button("💾 Enregistrer dans la BDD", use_container_width=True, key=f"save_{idx}_{st.session_state.question_type}"):
-                        save_question(data, st.session_state.current_context, st.session_state.question_type)
+                        verified, verification = verification_for_save(verdict)
+                        save_question(data, st.session_state.current_context, st.session_state.question_type, st.session_state.text_meta.get('niveau'), st.session_state.text_meta.get('difficulty'), verified, verification)
+                        if data == pending_draft(idx): mark_draft(idx, "accepted")  # seulement si c'est le brouillon qui est enregistré
                         # On met à jour le statut en utilisant la clé unique
                         st.session_state.question_saved_status[save_status_key] = True
                         st.success("Question enregistrée !")
@@ -180,7 +265,7 @@ with col2:
                 if groq_client:
                     if st.button("🔍 Analyser et Corriger avec l'IA", use_container_width=True, key=f"verify_{idx}"):
                         with st.spinner("Analyse par l'IA..."):
-                            st.session_state.verification_response = call_groq_for_verification(st.session_state.current_context, data, st.session_state.question_type)
+                            st.session_state.verification_response = verify_question(st.session_state.current_context, data, st.session_state.question_type)
                         st.rerun()
                 
                 if 'raw_output' in data:
@@ -200,6 +285,12 @@ if st.session_state.full_text and st.session_state.current_context:
     display_highlighted_context(st.session_state.full_text, st.session_state.current_context)
 
 st.sidebar.divider()
+st.sidebar.checkbox("Pré-filtre local avant Groq", key="use_prefilter")
+stats = st.session_state.prefilter_stats
+st.sidebar.metric("Appels Groq évités", stats["avoided_calls"], help=f"{stats['remote_calls']} appel(s) Groq effectué(s)")
+st.sidebar.metric("Tokens Groq évités (estimation)", stats["avoided_tokens"])
+st.sidebar.caption(f"Rejets locaux : {stats['auto_rejected']} · Régénérations automatiques : {stats['regenerated']}")
 if st.sidebar.button("🧹 Effacer & Recommencer", use_container_width=True):
+    cancel_prefetch()
     for key in list(st.session_state.keys()): del st.session_state[key]
     st.rerun()
\ No newline at end of file
@@ -0,0 +1,163 @@
+# llama_tuning.py
+# Startup auto-tuner for llama.cpp: benchmarks prefill/decode speed on this machine and persists the best
+# n_threads / n_threads_batch / n_batch / n_ctx per (host, model file). app.py's load_model picks it up automatically.
+#
+# -- python app.py --calibrate
+import datetime
+import json
+import os
+import socket
+import time
+
+TUNING_FILE = os.environ.get("LLAMA_TUNING_FILE", "./llama_tuning.json")
+
+# Values used when no calibration exists for this host/model (the historical hard-coded settings).
+DEFAULT_CONFIG = {"n_ctx": 2048, "n_threads": max(1, (os.cpu_count() or 2) // 2), "n_threads_batch": None, "n_batch": 512}
+
+BATCH_CANDIDATES = [128, 256, 512, 1024]
+MAX_GENERATION_TOKENS = 350  # max_tokens used by /generate_qcm and /generate_fitb
+DECODE_BENCH_TOKENS = 64
+TYPICAL_COMPLETION_TOKENS = 120  # typical length of a parsed QCM/FITB answer, used to weigh decode vs prefill
+# Room for the system prompt and chat markup around the chunk; the FITB system prompt is the longest (~150 tokens).
+PROMPT_OVERHEAD_TOKENS = 256
+
+REPRESENTATIVE_CHUNK = "Pour réaliser la photosynthèse, les plantes ont besoin de trois éléments principaux : la lumière du soleil, l'eau (absorbée par les racines) et le dioxyde de carbone (CO2) (absorbé par les feuilles). Le processus se déroule dans des organites cellulaires appelés chloroplastes, qui contiennent un pigment vert, la chlorophylle. L'un des sous-produits les plus importants de la photosynthèse est l'oxygène (O2). Ce gaz, indispensable à la respiration de la plupart des êtres vivants, y compris les humains, est libéré dans l'atmosphère."
+
+# Representative request: the QCM system prompt with a typical paragraph from the text library.
+PROMPT_TEMPLATE = """<|im_start|>system
+Tu es un assistant expert en génération de questions à choix multiples (QCM) en français, basées sur un texte fourni.
+Le format de sortie doit être :
+Question: [Ta question]
+Options:
+A) [Option A]
+B) [Option B]
+C) [Option C]
+D) [Option D]
+Réponse: [Lettre de la bonne réponse, e.g., A]<|im_end|>
+<|im_start|>user
+Texte: {chunk}
+
+Génère un QCM à partir de ce texte.<|im_end|>
+<|im_start|>assistant
+"""
+REPRESENTATIVE_PROMPT = PROMPT_TEMPLATE.format(chunk=REPRESENTATIVE_CHUNK)
+
+
+def config_key(model_path):
+    # The file size distinguishes re-quantized or re-downloaded models sharing a filename.
+    return f"{socket.gethostname()}|{os.path.basename(model_path)}|{os.path.getsize(model_path)}"
+
+
+def _read_tuning_file():
+    if not os.path.exists(TUNING_FILE): return {}
+    try:
+        with open(TUNING_FILE, encoding="utf-8") as f: return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Ignoring unreadable tuning file {TUNING_FILE}: {e}")
+        return {}
+
+
+def load_tuned_config(model_path):
+    """Best known llama.cpp settings for this host and model file, or DEFAULT_CONFIG if never calibrated."""
+    entry = _read_tuning_file().get(config_key(model_path))
+    if entry:
+        print(f"Using calibrated llama.cpp settings from {TUNING_FILE}: {entry['config']}")
+        return dict(DEFAULT_CONFIG, **entry["config"])
+    return dict(DEFAULT_CONFIG)
+
+
+def save_tuned_config(model_path, config, results):
+    data = _read_tuning_file()
+    data[config_key(model_path)] = {"config": config, "results": results, "calibrated_at": datetime.datetime.utcnow().isoformat()}
+    tmp_path = TUNING_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f: json.dump(data, f, indent=2)
+    os.replace(tmp_path, TUNING_FILE)
+
+
+def thread_candidates():
+    cpus = os.cpu_count() or 2
+    return sorted({max(1, cpus * k // 4) for k in (1, 2, 3, 4)})
+
+
+def benchmark(model_path, config, prompt=REPRESENTATIVE_PROMPT, n_gpu_layers=-1):
+    """Loads the model with `config` and measures prefill and decode throughput (tokens/s)."""
+    from llama_cpp import Llama
+    llm = Llama(model_path=model_path, n_gpu_layers=n_gpu_layers, chat_format="chatml", verbose=False, **config)
+    try:
+        tokens = llm.tokenize(prompt.encode("utf-8"))
+        llm.eval(tokens[:8])  # warm-up (weights paging, kernel init)
+        llm.reset()
+        started = time.perf_counter()
+        llm.eval(tokens)
+        prefill_seconds = time.perf_counter() - started
+        llm.reset()
+        started = time.perf_counter()
+        output = llm(prompt, max_tokens=DECODE_BENCH_TOKENS, temperature=0.0)
+        total_seconds = time.perf_counter() - started
+        completion_tokens = max(1, output["usage"]["completion_tokens"])
+        decode_seconds = max(total_seconds - prefill_seconds, 1e-6)
+    finally:
+        del llm
+    result = {"prompt_tokens": len(tokens), "prefill_tps": len(tokens) / prefill_seconds, "decode_tps": completion_tokens / decode_seconds}
+    # Estimated wall time of a typical /generate_* request with these settings: the value being minimized.
+    result["request_seconds"] = len(tokens) / result["prefill_tps"] + TYPICAL_COMPLETION_TOKENS / result["decode_tps"]
+    return result
+
+
+def longest_library_chunk():
+    # Longest paragraph of the text library, so n_ctx fits real inputs; falls back to the representative chunk.
+    try:
+        from db_utils import load_texts
+        from text_utils import chunk_text_by_paragraph
+        chunks = [c for t in load_texts() for c in chunk_text_by_paragraph(t.get("texte", ""))]
+    except Exception as e:
+        print(f"Could not read the text library ({e}); sizing the context from the representative chunk.")
+        chunks = []
+    return max(chunks + [REPRESENTATIVE_CHUNK], key=len)
+
+
+def required_context(model_path, chunk):
+    """Context size for `chunk` + prompt + a full answer, rounded up to a power of two and never below the default."""
+    from llama_cpp import Llama
+    tokenizer = Llama(model_path=model_path, vocab_only=True, verbose=False)
+    needed = len(tokenizer.tokenize(chunk.encode("utf-8"))) + PROMPT_OVERHEAD_TOKENS + MAX_GENERATION_TOKENS
+    n_ctx = DEFAULT_CONFIG["n_ctx"]
+    while n_ctx < needed: n_ctx *= 2
+    return n_ctx
+
+
+def calibrate(model_path, n_gpu_layers=-1):
+    """
+    n_ctx is sized from the longest library chunk (not timed: it only has to fit the inputs).
+    Then a coordinate search, one parameter at a time, keeping the best value before moving to the next:
+    n_threads (decode speed), n_threads_batch (prefill speed), n_batch (estimated request time).
+    """
+    results = []
+
+    def run(config):
+        print(f"Benchmarking {config} ...", end=" ", flush=True)
+        try:
+            result = benchmark(model_path, config, n_gpu_layers=n_gpu_layers)
+        except Exception as e:
+            print(f"failed: {e}")
+            return None
+        print(f"prefill {result['prefill_tps']:.1f} tok/s, decode {result['decode_tps']:.1f} tok/s, ~{result['request_seconds']:.2f}s/request")
+        results.append({"config": dict(config), **result})
+        return result
+
+    def best_of(base, param, values, metric, higher_is_better):
+        scored = [(value, run(dict(base, **{param: value}))) for value in values]
+        scored = [(value, r[metric]) for value, r in scored if r]
+        if not scored: return base[param]
+        return (max if higher_is_better else min)(scored, key=lambda s: s[1])[0]
+
+    config = dict(DEFAULT_CONFIG)
+    config["n_ctx"] = required_context(model_path, longest_library_chunk())
+    print(f"Context size: {config['n_ctx']} tokens")
+    config["n_threads"] = best_of(config, "n_threads", thread_candidates(), "decode_tps", True)
+    config["n_threads_batch"] = best_of(config, "n_threads_batch", thread_candidates(), "prefill_tps", True)
+    config["n_batch"] = best_of(config, "n_batch", [b for b in BATCH_CANDIDATES if b <= config["n_ctx"]], "request_seconds", False)
+
+    save_tuned_config(model_path, config, results)
+    print(f"Best llama.cpp settings for {config_key(model_path)}: {config} (saved to {TUNING_FILE})")
+    return config
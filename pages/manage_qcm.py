@@ -33,9 +33,11 @@ else:
                     
                     if st.form_submit_button("Enregistrer", use_container_width=True):
                         updated_data = {"question": new_q_text, "option_A": new_a, "option_B": new_b, "option_C": new_c, "option_D": new_d, "correct_option": new_ans}
-                        update_question(COLLECTION_NAME, q_id_str, updated_data)
-                        st.success("Question mise à jour !")
-                        st.rerun()
+                        if update_question(COLLECTION_NAME, q_id_str, updated_data) is False:
+                            st.error("Une question identique existe déjà.")
+                        else:
+                            st.success("Question mise à jour !")
+                            st.rerun()
             
             # La colonne de suppression contient le bouton, en dehors du formulaire
             with delete_col:
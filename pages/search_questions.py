@@ -0,0 +1,47 @@
+import streamlit as st
+from collections import defaultdict
+from db_utils import load_texts, get_questions_by_ids, get_mongo_client, count_questions_by_chunk
+from vector_index import get_vector_index, QUESTION_PREFIXES
+
+st.set_page_config(page_title="Recherche & Couverture", layout="wide")
+st.title("🔎 Recherche par Mots-clés & Couverture des Textes")
+get_mongo_client()
+
+index = get_vector_index()
+search_tab, coverage_tab = st.tabs(["Recherche de questions", "Couverture d'un texte"])
+
+with search_tab:
+    query = st.text_input("Rechercher des questions sur…", placeholder="ex: photosynthèse")
+    st.caption("Recherche lexicale : les questions doivent partager des mots (ou des racines) avec la requête ; les synonymes ne sont pas reconnus.")
+    k = st.slider("Nombre de résultats", 5, 50, 10)
+    if query:
+        hits = index.search(query, k=k, prefixes=QUESTION_PREFIXES)
+        ids_by_collection = defaultdict(list)
+        for key, _ in hits:
+            collection_name, q_id = key.split(":", 1)
+            ids_by_collection[collection_name].append(q_id)
+        docs = {f"{c}:{d['_id']}": d for c, ids in ids_by_collection.items() for d in get_questions_by_ids(c, ids)}
+        if not hits: st.info("Aucune question indexée. Lancez `python vector_index.py rebuild`.")
+        for key, score in hits:
+            doc = docs.get(key)
+            if doc is None: continue  # supprimée depuis l'indexation
+            q_type = "QCM" if key.startswith("qcm") else "FITB"
+            with st.expander(f"[{score:.2f}] {q_type} — {doc.get('question', '')[:90].replace(chr(10), ' ')}"):
+                st.markdown(f"**A)** {doc.get('option_A', '')}  \n**B)** {doc.get('option_B', '')}  \n**C)** {doc.get('option_C', '')}  \n**D)** {doc.get('option_D', '')}")
+                st.markdown(f"**Réponse :** {doc.get('correct_option', 'N/A')}")
+                st.caption(f"Source : {doc.get('source_text', '')[:200]}")
+
+with coverage_tab:
+    texts = load_texts()
+    if not texts: st.info("Aucun texte dans la bibliothèque.")
+    else:
+        labels = {f"{t.get('niveau', 'N/A')} - {t['texte'][:50].replace(chr(10), ' ')}...": t for t in texts}
+        selected = labels[st.selectbox("Texte", list(labels.keys()))]
+        # Seules les questions générées à partir de ce texte comptent (même segment source).
+        coverage = count_questions_by_chunk(selected["texte"])
+        covered = sum(1 for n in coverage.values() if n)
+        st.metric("Segments couverts", f"{covered} / {len(coverage)}")
+        for i, (chunk, n) in enumerate(coverage.items()):
+            icon = "✅" if n else "⚠️"
+            st.markdown(f"{icon} **Segment {i + 1}** — {n} question(s)")
+            st.caption(chunk[:200].replace("\n", " "))
@@ -0,0 +1,101 @@
+# pregen_worker.py
+# Worker optionnel : pré-génère des brouillons QCM et FITB pour chaque segment des textes ajoutés ou modifiés.
+# Écoute un change stream MongoDB (replica set / Atlas) ; sur un mongod autonome, repli sur un sondage de `updated_at`.
+# Les générations sont envoyées à l'API Flask en priorité basse : les demandes de l'interface passent avant.
+#
+# -- python pregen_worker.py
+import datetime
+import os
+import time
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from db_utils import get_db, ensure_draft_indexes, load_drafts, save_draft, invalidate_stale_drafts, chunk_hash, DRAFTS_COLLECTION
+from generation_client import call_flask_api, endpoint_for
+from quality_filter import prefilter_question, MAX_AUTO_REGENERATIONS
+from text_utils import chunk_text_by_paragraph
+
+POLL_SECONDS = int(os.environ.get("PREGEN_POLL_SECONDS", "30"))
+PAUSE_BETWEEN_GENERATIONS = float(os.environ.get("PREGEN_PAUSE_SECONDS", "1"))
+QUESTION_TYPES = ("QCM", "FITB")
+
+
+def generate_draft(chunk, question_type):
+    # Même règle que l'interface (generate_with_prefilter) : on régénère tant que le pré-filtre rejette, ici en priorité basse.
+    verdict, score = "reject", 0.0
+    for _ in range(1 + MAX_AUTO_REGENERATIONS):
+        data = call_flask_api(endpoint_for(question_type), chunk, priority="low")
+        time.sleep(PAUSE_BETWEEN_GENERATIONS)
+        if "error" in data: return data, verdict, score
+        verdict, score, _ = prefilter_question(chunk, data, question_type)
+        if verdict != "reject": break
+    return data, verdict, score
+
+
+def process_text(text_doc):
+    text_id, chunks = str(text_doc["_id"]), chunk_text_by_paragraph(text_doc.get("texte", ""))
+    hashes = [chunk_hash(c) for c in chunks]
+    removed = invalidate_stale_drafts(text_id, hashes)
+    # Tous les statuts comptent : un brouillon déjà accepté ou rejeté pour ce segment n'est pas régénéré.
+    existing = set(load_drafts(text_id, status=None))
+    generated = 0
+    for chunk_index, (chunk, h) in enumerate(zip(chunks, hashes)):
+        for question_type in QUESTION_TYPES:
+            if (h, question_type) in existing: continue
+            data, verdict, score = generate_draft(chunk, question_type)
+            if "error" in data:
+                print(f"[{text_id}] segment {chunk_index} ({question_type}) : {data['error']}")
+                continue
+            # Encore rejeté après les régénérations : conservé pour mémoire, mais jamais proposé à l'enseignant.
+            status = "rejected" if verdict == "reject" else "pending"
+            save_draft(text_id, chunk_index, chunk, question_type, data, {"verdict": verdict, "score": score}, status)
+            generated += 1
+    print(f"[{text_id}] {len(chunks)} segments, {generated} brouillon(s) généré(s), {removed} brouillon(s) périmé(s) supprimé(s).")
+
+
+def watch_change_stream(db, progress):
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+    with db.textes.watch(pipeline, full_document="updateLookup") as stream:
+        print("Écoute du change stream sur 'textes'...")
+        for change in stream:
+            if change["operationType"] == "delete":
+                db[DRAFTS_COLLECTION].delete_many({"text_id": str(change["documentKey"]["_id"])})
+            elif change.get("fullDocument"):
+                process_text(change["fullDocument"])
+                progress["last_seen"] = max(progress["last_seen"], change["fullDocument"].get("updated_at") or progress["last_seen"])
+
+
+def poll_for_changes(db, last_seen):
+    print(f"Change stream indisponible : sondage toutes les {POLL_SECONDS}s.")
+    while True:
+        try:
+            for text_doc in db.textes.find({"updated_at": {"$gt": last_seen}}).sort("updated_at", 1):
+                process_text(text_doc)
+                last_seen = text_doc["updated_at"]
+        except PyMongoError as e:  # le texte en échec sera repris au prochain sondage
+            print(f"Erreur MongoDB pendant le sondage ({e}).")
+        time.sleep(POLL_SECONDS)
+
+
+def main():
+    if hasattr(os, "nice"): os.nice(10)
+    db = get_db()
+    if db is None: raise SystemExit("Connexion à MongoDB impossible (vérifiez .streamlit/secrets.toml).")
+    ensure_draft_indexes()
+    # Dernier `updated_at` traité : point de reprise du sondage si le change stream est indisponible ou tombe.
+    progress = {"last_seen": datetime.datetime.min}
+    # Rattrapage au démarrage : seuls les segments sans brouillon sont générés.
+    for text_doc in db.textes.find():
+        process_text(text_doc)
+        progress["last_seen"] = max(progress["last_seen"], text_doc.get("updated_at") or progress["last_seen"])
+    try:
+        watch_change_stream(db, progress)
+    except OperationFailure:  # mongod autonome : pas de change stream
+        poll_for_changes(db, progress["last_seen"])
+    except PyMongoError as e:
+        print(f"Change stream interrompu ({e}).")
+        poll_for_changes(db, progress["last_seen"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# quality_filter.py
+# Pré-filtre local (règles + recouvrement lexical) appliqué avant la vérification distante par Groq.
+# Les questions manifestement cassées sont rejetées, les très bonnes acceptées ; seules les "limites" partent chez Groq.
+import re
+
+from text_utils import content_words, normalize_words
+
+ACCEPT_SCORE = 0.8
+REJECT_SCORE = 0.35
+MAX_AUTO_REGENERATIONS = 2  # tentatives supplémentaires quand le pré-filtre local rejette la question
+BLANK_PATTERN = re.compile(r"_{3,}")
+PARSE_FAILURE_PREFIX = "Could not parse"
+# Estimation grossière (≈ 4 caractères par token) et taille typique d'une analyse Groq, pour les compteurs d'économie.
+CHARS_PER_TOKEN = 4
+VERIFICATION_RESPONSE_TOKENS = 400
+
+
+def estimate_tokens(text):
+    return len(text or "") // CHARS_PER_TOKEN
+
+
+def _coverage(words, reference):
+    # Part des mots de `words` présents dans `reference` (1.0 si aucun mot porteur de sens).
+    return sum(1 for w in words if w in reference) / len(words) if words else 1.0
+
+
+def prefilter_question(context, q_data, question_type):
+    """Retourne (verdict, score, raisons) avec verdict parmi "reject", "borderline", "accept"."""
+    if "error" in q_data: return "reject", 0.0, [f"Erreur de génération : {q_data['error']}"]
+    question = q_data.get("question") or ""
+    options = {letter: (q_data.get(letter) or "").strip() for letter in "ABCD"}
+    answer = (q_data.get("reponse") or "").strip().upper()
+
+    # --- Règles bloquantes ---
+    reasons = []
+    if not question or question.startswith(PARSE_FAILURE_PREFIX): reasons.append("Question absente ou non analysable.")
+    if any(not o or o.startswith(PARSE_FAILURE_PREFIX) for o in options.values()): reasons.append("Option(s) manquante(s) ou non analysable(s).")
+    if answer not in options: reasons.append(f"Lettre de réponse invalide : '{answer}' (attendu A–D).")
+    if question_type == "FITB" and not BLANK_PATTERN.search(question): reasons.append("FITB sans blanc (______) dans la question.")
+    normalized_options = [" ".join(normalize_words(o)) for o in options.values()]
+    if len(set(normalized_options)) < len(normalized_options): reasons.append("Options en double.")
+    if reasons: return "reject", 0.0, reasons
+
+    context_words = set(normalize_words(context))
+    answer_text = options[answer]
+    answer_words = content_words(answer_text) or normalize_words(answer_text)
+    answer_support = _coverage(answer_words, context_words)
+    if answer_support == 0: return "reject", 0.0, [f"La réponse « {answer_text} » n'apparaît pas dans le segment source."]
+
+    # --- Score lexical ---
+    question_support = _coverage(content_words(BLANK_PATTERN.sub(" ", question)), context_words)
+    distractors = [o for letter, o in options.items() if letter != answer]
+    # Un distracteur aussi présent dans le texte que la réponse rend la question ambiguë (ou la lettre de réponse fausse).
+    ambiguous = [d for d in distractors if content_words(d) and _coverage(content_words(d), context_words) >= answer_support]
+    # La bonne réponse nettement plus longue que les autres options est un indice trop facile.
+    length_giveaway = len(answer_text) > 2 * max(len(d) for d in distractors)
+    score = 0.5 * answer_support + 0.3 * question_support + 0.2 * (1 - len(ambiguous) / len(distractors))
+    if length_giveaway: score -= 0.15
+    notes = [f"Réponse retrouvée dans le texte à {answer_support:.0%}.", f"Vocabulaire de la question présent dans le texte à {question_support:.0%}."]
+    if ambiguous: notes.append(f"{len(ambiguous)} distracteur(s) également présent(s) dans le texte (ambiguïté possible).")
+    if length_giveaway: notes.append("Bonne réponse beaucoup plus longue que les distracteurs.")
+
+    # Seul Groq peut trancher entre des options toutes appuyées par le texte : jamais d'acceptation locale dans ce cas.
+    if score < REJECT_SCORE: verdict = "reject"
+    elif score >= ACCEPT_SCORE and not ambiguous and not length_giveaway: verdict = "accept"
+    else: verdict = "borderline"
+    return verdict, round(score, 2), notes
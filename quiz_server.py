@@ -0,0 +1,116 @@
+# quiz_server.py
+# API de lecture pour le jeu : tire des quiz aléatoires depuis un pool en mémoire rafraîchi en arrière-plan.
+# Lancement : python quiz_server.py   puis   GET /quiz?n=10&niveau=CM1&difficulty=moyenne&type=mixed
+import os
+import random
+import threading
+import time
+from bisect import bisect_right
+from itertools import accumulate
+
+from flask import Flask, jsonify, request
+
+from db_utils import QUESTION_COLLECTIONS, backfill_question_levels, backfill_random_keys, ensure_question_indexes, get_db, iter_questions, sample_questions
+
+app = Flask(__name__)
+
+POOL_REFRESH_SECONDS = int(os.environ.get("QUIZ_POOL_REFRESH_SECONDS", "60"))
+MAX_QUIZ_SIZE = 50
+QUIZ_FIELDS = {"question": 1, "option_A": 1, "option_B": 1, "option_C": 1, "option_D": 1, "correct_option": 1, "niveau": 1, "difficulty": 1}
+
+
+def to_quiz_item(doc, question_type):
+    return {"id": str(doc["_id"]), "type": question_type, "question": doc.get("question"),
+            "options": {letter: doc.get(f"option_{letter}") for letter in "ABCD"},
+            "reponse": doc.get("correct_option"), "niveau": doc.get("niveau"), "difficulty": doc.get("difficulty")}
+
+
+class QuestionPool:
+    """Questions regroupées par (type, niveau, difficulté), remplacées en bloc à chaque rafraîchissement."""
+
+    def __init__(self):
+        self.buckets = None  # None tant que le premier chargement n'est pas terminé
+
+    def refresh(self):
+        # En cas d'échec (BDD injoignable...), l'ancien pool reste en place ; s'il n'y en a pas, /quiz passe par la BDD.
+        if get_db() is None: raise ConnectionError("Connexion à MongoDB impossible.")
+        buckets = {}
+        for question_type, collection_name in QUESTION_COLLECTIONS.items():
+            for doc in iter_questions(collection_name, projection=QUIZ_FIELDS):
+                key = (question_type, doc.get("niveau"), doc.get("difficulty"))
+                buckets.setdefault(key, []).append(to_quiz_item(doc, question_type))
+        self.buckets = buckets  # échange atomique : les lecteurs voient l'ancien ou le nouveau pool, jamais un mélange
+
+    def refresh_forever(self):
+        while True:
+            try:
+                started = time.perf_counter()
+                self.refresh()
+                print(f"Pool de quiz rafraîchi : {sum(map(len, self.buckets.values()))} questions en {time.perf_counter() - started:.1f}s.")
+            except Exception as e:
+                print(f"Erreur lors du rafraîchissement du pool : {e}")
+            time.sleep(POOL_REFRESH_SECONDS)
+
+    def sample(self, n, types, level=None, difficulty=None):
+        buckets, result = self.buckets, []
+        for question_type, count in zip(types, split_per_type(n, types)):
+            candidates = [items for (q_type, q_level, q_difficulty), items in buckets.items()
+                          if q_type == question_type and (not level or q_level == level) and (not difficulty or q_difficulty == difficulty)]
+            # Tirage sans remise sur la concaténation virtuelle des groupes, sans copier les listes.
+            offsets = list(accumulate(len(items) for items in candidates))
+            total = offsets[-1] if offsets else 0
+            for i in random.sample(range(total), min(count, total)):
+                bucket = bisect_right(offsets, i)
+                result.append(candidates[bucket][i - (offsets[bucket - 1] if bucket else 0)])
+        random.shuffle(result)
+        return result
+
+
+def split_per_type(n, types):
+    # Répartition identique pour le pool et le repli BDD : type=mixed donne autant de QCM que de FITB (à une près).
+    return [n // len(types) + (1 if i < n % len(types) else 0) for i in range(len(types))]
+
+
+POOL = QuestionPool()
+
+
+def sample_from_db(n, types, level, difficulty):
+    # Repli avant le premier chargement du pool : échantillonnage sur la clé aléatoire indexée.
+    items = []
+    for question_type, count in zip(types, split_per_type(n, types)):
+        if count:
+            items += [to_quiz_item(d, question_type) for d in sample_questions(QUESTION_COLLECTIONS[question_type], count, level, difficulty)]
+    random.shuffle(items)
+    return items
+
+
+@app.route('/quiz')
+def quiz():
+    try:
+        n = min(max(int(request.args.get("n", 10)), 1), MAX_QUIZ_SIZE)
+    except ValueError:
+        return jsonify({"error": "Paramètre 'n' invalide."}), 400
+    q_type = request.args.get("type", "mixed").upper()
+    if q_type != "MIXED" and q_type not in QUESTION_COLLECTIONS:
+        return jsonify({"error": "Paramètre 'type' invalide (QCM, FITB ou mixed)."}), 400
+    types = list(QUESTION_COLLECTIONS) if q_type == "MIXED" else [q_type]
+    level, difficulty = request.args.get("niveau"), request.args.get("difficulty")
+
+    if POOL.buckets is None: questions = sample_from_db(n, types, level, difficulty)
+    else: questions = POOL.sample(n, types, level, difficulty)
+    return jsonify({"count": len(questions), "questions": questions})
+
+
+@app.route('/')
+def home():
+    status = "pool non chargé" if POOL.buckets is None else f"{sum(map(len, POOL.buckets.values()))} questions en mémoire"
+    return f"Quiz API ({status}). Utilisez GET /quiz?n=10&niveau=...&difficulty=...&type=QCM|FITB|mixed"
+
+
+if __name__ == '__main__':
+    for collection_name in QUESTION_COLLECTIONS.values():
+        ensure_question_indexes(collection_name)
+        backfill_random_keys(collection_name)
+        backfill_question_levels(collection_name)
+    threading.Thread(target=POOL.refresh_forever, daemon=True).start()
+    app.run(host='0.0.0.0', port=int(os.environ.get("QUIZ_PORT", "5001")), threaded=True)
@@ -0,0 +1,41 @@
+from quality_filter import prefilter_question
+
+CONTEXT = ("La première étape majeure est l'évaporation. Le soleil chauffe l'eau des océans, des lacs et des rivières, "
+           "la transformant en vapeur d'eau qui monte dans l'atmosphère. Ensuite vient la condensation, puis la précipitation "
+           "et enfin l'infiltration.")
+
+def make_question(question="Quelle est la première étape majeure du cycle de l'eau ?", answer="A", **options):
+    data = {"question": question, "A": "L'évaporation", "B": "Les nuages", "C": "Le vent", "D": "La neige", "reponse": answer}
+    data.update(options)
+    return data
+
+
+def test_accepts_supported_answer_with_unsupported_distractors():
+    verdict, score, _ = prefilter_question(CONTEXT, make_question(), "QCM")
+    assert verdict == "accept" and score >= 0.8
+
+def test_wrong_letter_among_supported_options_is_borderline():
+    data = make_question(answer="B", B="La condensation", C="La précipitation", D="L'infiltration")
+    verdict, _, reasons = prefilter_question(CONTEXT, data, "QCM")
+    assert verdict == "borderline"
+    assert any("distracteur" in r for r in reasons)
+
+def test_rejects_invalid_answer_letter():
+    assert prefilter_question(CONTEXT, make_question(answer="E"), "QCM")[0] == "reject"
+
+def test_rejects_duplicate_options():
+    assert prefilter_question(CONTEXT, make_question(B="L'évaporation"), "QCM")[0] == "reject"
+
+def test_rejects_fitb_without_blank():
+    assert prefilter_question(CONTEXT, make_question(question="La première étape est l'évaporation."), "FITB")[0] == "reject"
+
+def test_accepts_fitb_with_blank():
+    data = make_question(question="La première étape majeure du cycle est ______.")
+    assert prefilter_question(CONTEXT, data, "FITB")[0] == "accept"
+
+def test_rejects_answer_absent_from_chunk():
+    verdict, _, reasons = prefilter_question(CONTEXT, make_question(A="La photosynthèse"), "QCM")
+    assert verdict == "reject" and "n'apparaît pas" in reasons[0]
+
+def test_rejects_generation_error():
+    assert prefilter_question(CONTEXT, {"error": "Erreur de requête API"}, "QCM")[0] == "reject"
@@ -0,0 +1,77 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from vector_index import VectorIndex, chunk_key, question_key
+
+QUESTIONS = {
+    "a": "Quel pigment vert des chloroplastes permet la photosynthèse ? La chlorophylle",
+    "b": "Quelle est la première étape du cycle de l'eau ? L'évaporation des océans",
+    "c": "Quel gaz est libéré par la photosynthèse ? L'oxygène",
+}
+
+
+def make_index(path):
+    index = VectorIndex(str(path))
+    index.add_many([(question_key("qcm_questions", q_id), text) for q_id, text in QUESTIONS.items()])
+    return index
+
+def keys_of(hits):
+    return [key for key, _ in hits]
+
+
+def test_search_orders_by_similarity(tmp_path):
+    hits = make_index(tmp_path).search("chlorophylle des chloroplastes", k=3)
+    assert keys_of(hits)[0] == "qcm_questions:a"
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+
+def test_search_matches_inflected_forms(tmp_path):
+    assert keys_of(make_index(tmp_path).search("évaporation océan", k=1)) == ["qcm_questions:b"]
+
+def test_search_filters_by_prefix(tmp_path):
+    index = make_index(tmp_path)
+    index.add_many([(chunk_key("t1", 0), "La chlorophylle des chloroplastes capte la lumière.")])
+    assert all(k.startswith("qcm_questions:") for k in keys_of(index.search("chlorophylle", k=10, prefixes=["qcm_questions"])))
+    assert "textes:t1:0" in keys_of(index.search("chlorophylle", k=10))
+
+def test_remove_then_readd_last_line_wins(tmp_path):
+    index = make_index(tmp_path)
+    index.remove(["qcm_questions:a"])
+    assert "qcm_questions:a" not in keys_of(index.search("chlorophylle", k=10))
+    index.add_many([("qcm_questions:a", QUESTIONS["a"])])
+    assert keys_of(index.search("chlorophylle", k=1)) == ["qcm_questions:a"]
+
+def test_remove_prefix(tmp_path):
+    index = make_index(tmp_path)
+    index.add_many([(chunk_key("t1", 0), "chlorophylle"), (chunk_key("t1", 1), "évaporation"), (chunk_key("t2", 0), "oxygène")])
+    index.remove_prefix("textes:t1:")
+    snap = index.snapshot()
+    assert {k for k, i in snap.rows.items() if snap.active[i]} == {"qcm_questions:a", "qcm_questions:b", "qcm_questions:c", "textes:t2:0"}
+
+def test_reload_from_disk(tmp_path):
+    make_index(tmp_path).remove(["qcm_questions:c"])
+    reloaded = VectorIndex(str(tmp_path))
+    assert set(keys_of(reloaded.search("photosynthèse", k=10))) == {"qcm_questions:a", "qcm_questions:b"}
+
+def test_reload_ignores_partial_line(tmp_path):
+    index = make_index(tmp_path)
+    with open(index.keys_path, "a", encoding="utf-8") as f: f.write("qcm_questions:d\t0")  # écriture interrompue
+    assert len(VectorIndex(str(tmp_path)).snapshot().keys) == len(QUESTIONS)
+
+def test_compact_keeps_live_rows_and_results(tmp_path):
+    index = make_index(tmp_path)
+    index.remove(["qcm_questions:b"])
+    index.add_many([("qcm_questions:a", QUESTIONS["a"])])
+    before = index.search("photosynthèse oxygène", k=10)
+    index.compact()
+    snap = index.snapshot()
+    assert sorted(snap.keys) == ["qcm_questions:a", "qcm_questions:c"] and snap.active.all()
+    assert keys_of(index.search("photosynthèse oxygène", k=10)) == keys_of(before)
+    assert keys_of(VectorIndex(str(tmp_path)).search("photosynthèse oxygène", k=10)) == keys_of(before)
+
+def test_snapshot_survives_concurrent_append(tmp_path):
+    index = make_index(tmp_path)
+    snap = index.snapshot()
+    index.add_many([("qcm_questions:d", "Autre question sur la chlorophylle")])
+    assert len(snap.keys) == len(snap.active) == len(snap.vectors) == len(QUESTIONS)
+    assert len(index.snapshot().keys) == len(QUESTIONS) + 1
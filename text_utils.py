@@ -0,0 +1,22 @@
+import re
+import unicodedata
+
+def chunk_text_by_paragraph(text):
+    if not text: return []
+    return [p.strip() for p in re.split(r'\n\s*\n', text.strip()) if p.strip()]
+
+def normalize_words(text):
+    # Minuscules sans accents, découpage en mots : base commune des comparaisons lexicales.
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r"\w+", text)
+
+# Mots-outils fréquents ignorés par les comparaisons lexicales (ceux de moins de 3 lettres sont déjà écartés).
+STOPWORDS = {
+    "les", "des", "une", "est", "que", "qui", "dans", "par", "pour", "sur", "aux", "avec", "ces", "son", "ses",
+    "sont", "elle", "elles", "ils", "mais", "pas", "plus", "leur", "leurs", "cette", "cet", "tout", "tous",
+    "comme", "ont", "aussi", "entre", "quel", "quelle", "quels", "quelles", "selon", "texte", "ainsi",
+}
+
+def content_words(text):
+    return [w for w in normalize_words(text) if len(w) >= 3 and w not in STOPWORDS]
@@ -0,0 +1,229 @@
+# vector_index.py
+# Index vectoriel local (NumPy, sans base externe) des questions et des segments de textes.
+# Les embeddings sont calculés sur CPU par hachage de mots et de 4-grammes de caractères : aucun modèle à télécharger.
+# La recherche est donc lexicale (mots et racines communs), pas sémantique : "énergie lumineuse" ne retrouve pas
+# une question qui ne parle que de "lumière du soleil".
+# Stockage en ajout seul : vectors.f16 (lignes float16, lu en memmap) + keys.tsv (clé, drapeau de suppression).
+# La dernière ligne d'une clé fait foi ; `compact` réécrit l'index sans les lignes périmées.
+#
+# -- python vector_index.py rebuild
+# -- python vector_index.py search "photosynthèse"
+import os
+import sys
+import threading
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus courant
+    fcntl = None
+
+from text_utils import chunk_text_by_paragraph, content_words
+
+INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR", "./vector_index")
+DIM = 512
+BLOCK_ROWS = 65536
+QUESTION_PREFIXES = ("qcm_questions", "fitb_questions")
+
+
+def embed(texts, dim=DIM):
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in content_words(text):
+            # Le mot entier pèse 1, ses 4-grammes 0.5 : rapproche les formes fléchies ("chloroplaste"/"chloroplastes").
+            features = [(word, 1.0)]
+            if len(word) > 4: features += [(f"#{word[i:i + 4]}", 0.5) for i in range(len(word) - 3)]
+            for feature, weight in features:
+                h = zlib.crc32(feature.encode("utf-8"))  # stable entre processus, contrairement à hash()
+                out[row, h % dim] += weight if h & 0x80000000 else -weight
+    out = np.sign(out) * np.log1p(np.abs(out))
+    out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+    return out
+
+
+def question_key(collection_name, q_id): return f"{collection_name}:{q_id}"
+def chunk_key(text_id, chunk_index): return f"textes:{text_id}:{chunk_index}"
+
+
+def question_embedding_text(doc):
+    # Accepte le format stocké (option_A...) comme celui renvoyé par l'API (A...).
+    options = [doc.get(f"option_{l}") or doc.get(l) or "" for l in "ABCD"]
+    return "\n".join([doc.get("question") or ""] + options + [doc.get("source_text") or ""])
+
+
+# État chargé de l'index, jamais modifié en place : une recherche garde le sien même si un autre thread recharge l'index.
+Snapshot = namedtuple("Snapshot", "keys rows active prefixes vectors")
+
+
+class VectorIndex:
+    def __init__(self, path=INDEX_DIR, dim=DIM):
+        self.path, self.dim = path, dim
+        self.vectors_path = os.path.join(path, "vectors.f16")
+        self.keys_path = os.path.join(path, "keys.tsv")
+        self.lock_path = os.path.join(path, ".lock")
+        self.lock = threading.Lock()
+        self._loaded_state = -1
+        self._snapshot = self._empty_snapshot()
+
+    def _empty_snapshot(self):
+        return Snapshot((), {}, np.zeros(0, dtype=bool), np.array([], dtype=str), np.zeros((0, self.dim), dtype=np.float16))
+
+    @contextmanager
+    def _locked(self, shared=False):
+        # Verrou de fichier en plus du verrou de thread : Streamlit, quiz_server et bank_io écrivent dans le même index.
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.lock_path, "a") as f:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try: yield
+                finally: fcntl.flock(f, fcntl.LOCK_UN)
+
+    # --- LECTURE ---
+
+    def _refresh(self):
+        # Recharge uniquement si keys.tsv a changé (ajouts, ou fichier remplacé par compact/rebuild). À appeler sous verrou.
+        stat = os.stat(self.keys_path) if os.path.exists(self.keys_path) else None
+        state, size = (stat.st_ino, stat.st_size) if stat else None, stat.st_size if stat else 0
+        if state == self._loaded_state: return self._snapshot
+        keys, deleted = [], []
+        if size:
+            with open(self.keys_path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"): break  # ligne en cours d'écriture par un autre processus
+                    key, flag = line.rstrip("\n").split("\t")
+                    keys.append(key)
+                    deleted.append(flag == "1")
+        rows = {key: i for i, key in enumerate(keys)}
+        active = np.zeros(len(keys), dtype=bool)
+        for key, i in rows.items(): active[i] = not deleted[i]
+        active.flags.writeable = False
+        # Les vecteurs sont écrits avant les clés : le fichier contient toujours au moins len(keys) lignes.
+        vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(len(keys), self.dim)) if keys else np.zeros((0, self.dim), dtype=np.float16)
+        self._snapshot = Snapshot(tuple(keys), rows, active, np.array([k.split(":", 1)[0] for k in keys], dtype=str), vectors)
+        self._loaded_state = state
+        return self._snapshot
+
+    def snapshot(self):
+        with self._locked(shared=True): return self._refresh()
+
+    @staticmethod
+    def _scores(snap, queries):
+        # Produit scalaire par blocs : le memmap n'est jamais converti en float32 d'un seul coup.
+        n = len(snap.keys)
+        out = np.empty((n, len(queries)), dtype=np.float32)
+        for start in range(0, n, BLOCK_ROWS):
+            out[start:start + BLOCK_ROWS] = snap.vectors[start:start + BLOCK_ROWS].astype(np.float32) @ queries.T
+        return out
+
+    def search(self, query, k=10, prefixes=None):
+        snap = self.snapshot()
+        mask = snap.active.copy()
+        if prefixes: mask &= np.isin(snap.prefixes, list(prefixes))
+        if not mask.any(): return []
+        scores = self._scores(snap, embed([query], self.dim))[:, 0]
+        scores[~mask] = -np.inf
+        k = min(k, int(mask.sum()))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(snap.keys[i], float(scores[i])) for i in top]
+
+    # --- ÉCRITURE ---
+
+    def _append(self, keys, vectors, deleted=False):
+        os.makedirs(self.path, exist_ok=True)
+        with self._locked():
+            with open(self.vectors_path, "ab") as f: f.write(vectors.astype(np.float16).tobytes())
+            with open(self.keys_path, "a", encoding="utf-8") as f: f.writelines(f"{k}\t{int(deleted)}\n" for k in keys)
+
+    def add_many(self, items):
+        """items : liste de (clé, texte)."""
+        if not items: return
+        keys, texts = zip(*items)
+        self._append(keys, embed(list(texts), self.dim))
+
+    def remove(self, keys):
+        keys = list(keys)
+        if keys: self._append(keys, np.zeros((len(keys), self.dim), dtype=np.float16), deleted=True)
+
+    def remove_prefix(self, prefix):
+        snap = self.snapshot()
+        self.remove(k for k, i in snap.rows.items() if k.startswith(prefix) and snap.active[i])
+
+    def compact(self):
+        with self._locked():
+            snap = self._refresh()
+            live = np.flatnonzero(snap.active)
+            tmp_vectors, tmp_keys = self.vectors_path + ".tmp", self.keys_path + ".tmp"
+            with open(tmp_vectors, "wb") as f:
+                for start in range(0, len(live), BLOCK_ROWS): f.write(np.asarray(snap.vectors[live[start:start + BLOCK_ROWS]]).tobytes())
+            with open(tmp_keys, "w", encoding="utf-8") as f: f.writelines(f"{snap.keys[i]}\t0\n" for i in live)
+            # Les recherches en cours gardent leur snapshot (l'ancien fichier reste lisible tant qu'il est mappé).
+            self._snapshot, self._loaded_state = self._empty_snapshot(), -1
+            del snap
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_keys, self.keys_path)
+
+    # --- SYNCHRONISATION AVEC LA BDD ---
+
+    def index_question(self, collection_name, q_id, doc):
+        self.add_many([(question_key(collection_name, q_id), question_embedding_text(doc))])
+
+    def index_questions(self, collection_name, docs):
+        """docs : documents stockés (avec _id), indexés en un seul ajout."""
+        self.add_many([(question_key(collection_name, d["_id"]), question_embedding_text(d)) for d in docs])
+
+    def index_text(self, text_id, text):
+        self.remove_prefix(f"textes:{text_id}:")
+        self.add_many([(chunk_key(text_id, i), c) for i, c in enumerate(chunk_text_by_paragraph(text))])
+
+    def remove_question(self, collection_name, q_id):
+        self.remove([question_key(collection_name, q_id)])
+
+    def remove_text(self, text_id):
+        self.remove_prefix(f"textes:{text_id}:")
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+def get_vector_index():
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None: _INDEX = VectorIndex()
+    return _INDEX
+
+
+def rebuild(batch_size=1000):
+    from db_utils import QUESTION_COLLECTIONS, iter_questions, load_texts
+    index = get_vector_index()
+    with index._locked():
+        for path in (index.vectors_path, index.keys_path):
+            if os.path.exists(path): os.remove(path)
+        index._loaded_state = -1
+    for text in load_texts():
+        index.index_text(str(text["_id"]), text.get("texte", ""))
+    for collection_name in QUESTION_COLLECTIONS.values():
+        batch = []
+        for doc in iter_questions(collection_name, batch_size=batch_size):
+            batch.append((question_key(collection_name, doc["_id"]), question_embedding_text(doc)))
+            if len(batch) >= batch_size:
+                index.add_many(batch)
+                batch = []
+        index.add_many(batch)
+    print(f"Index reconstruit : {int(index.snapshot().active.sum())} vecteurs dans {index.path}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "rebuild": rebuild()
+    elif command == "compact": get_vector_index().compact()
+    elif command == "search" and len(sys.argv) > 2:
+        for key, score in get_vector_index().search(" ".join(sys.argv[2:])): print(f"{score:.3f}  {key}")
+    else: print("Usage : python vector_index.py rebuild | compact | search <requête>")